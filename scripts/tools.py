@@ -1,25 +1,50 @@
 import os
 import subprocess
-import re
 
-# We hardcode or pass the repo root to ensure the agent 
+# We hardcode or pass the repo root to ensure the agent
 # never accidentally edits files outside the testbed.
 REPO_ROOT = "/testbed"
 
+# Precomputed prefix: plain concatenation skips os.path.join's per-call
+# parsing, and unlike join it keeps absolute-looking inputs rooted inside
+# the testbed.
+_REPO_PREFIX = REPO_ROOT + os.sep
+
 def read_file(path):
-    full_path = os.path.join(REPO_ROOT, path)
+    full_path = _REPO_PREFIX + path
     try:
         with open(full_path, 'r', encoding='utf-8') as f:
             return f.read()
     except Exception as e:
         return f"Error reading file: {e}"
 
+def _atomic_write(full_path, content):
+    # Write to a sibling temp file and rename over the target: one write
+    # syscall for the whole payload and no window where the target holds
+    # partial content.
+    tmp = full_path + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp, full_path)
+
+# Directories already ensured this run — repeat writes into the same place
+# skip the stat walk makedirs performs.
+_MKDIR_CACHE = set()
+
 def write_file(path, content):
-    full_path = os.path.join(REPO_ROOT, path)
+    full_path = _REPO_PREFIX + path
     try:
-        os.makedirs(os.path.dirname(full_path), exist_ok=True)
-        with open(full_path, 'w', encoding='utf-8') as f:
-            f.write(content)
+        dirname = os.path.dirname(full_path)
+        if dirname not in _MKDIR_CACHE:
+            os.makedirs(dirname, exist_ok=True)
+            _MKDIR_CACHE.add(dirname)
+        try:
+            _atomic_write(full_path, content)
+        except FileNotFoundError:
+            # A cached directory was removed out-of-band (e.g. via
+            # run_bash); recreate it and retry once.
+            os.makedirs(dirname, exist_ok=True)
+            _atomic_write(full_path, content)
         return f"Successfully wrote to {path}"
     except Exception as e:
         return f"Error writing file: {e}"
@@ -29,17 +54,20 @@ def edit_file(path, old, new):
     Search and replace tool. Using exact match to prevent 
     the agent from hallucinating nearby code.
     """
-    full_path = os.path.join(REPO_ROOT, path)
+    full_path = _REPO_PREFIX + path
     try:
         with open(full_path, 'r', encoding='utf-8') as f:
             content = f.read()
         
-        if old not in content:
+        # One find() locates the block and doubles as the existence check,
+        # and splicing replaces only the first occurrence so an ambiguous
+        # 'old' can never rewrite unrelated sites.
+        idx = content.find(old)
+        if idx < 0:
             return f"Error: Could not find exact match for the 'old' block in {path}"
-        
-        new_content = content.replace(old, new)
-        with open(full_path, 'w', encoding='utf-8') as f:
-            f.write(new_content)
+
+        new_content = content[:idx] + new + content[idx + len(old):]
+        _atomic_write(full_path, new_content)
         return f"Successfully edited {path}"
     except Exception as e:
         return f"Error editing file: {e}"